@@ -39,11 +39,10 @@ from pwem.protocols import EMProtocol
 from pwem.objects.data import AtomStruct
 from pwchem.objects import SetOfStructROIs
 
-import pwem.convert as emconv
 from pwchem.utils.utils import cleanPDB
 
 from alexov import Plugin
-from alexov.constants import AA_THREE_TO_ONE
+from alexov.utils import validateMutationLists
 
 class ProtocolSAAMBE3D(EMProtocol):
     """
@@ -212,63 +211,12 @@ class ProtocolSAAMBE3D(EMProtocol):
     def _validate(self):
         errors = []   
 
-        structureHandler = emconv.AtomicStructHandler()
-        structureHandler.read(self.inputAtomStruct.get().getFileName())
-        structureHandler.getStructure()
-        modelsLength, modelsFirstResidue = structureHandler.getModelsChains()
-        
-        validChains = set()
-        chainResidues = {}
-
-        for modelID, chains in modelsFirstResidue.items():
-            for chainID, residues in chains.items():
-                filtered_residues = [res for res in residues if res[1] != 'HOH']
-                validChains.add(chainID)
-                if chainID not in chainResidues:
-                    chainResidues[chainID] = filtered_residues
-
         if not self.toMutateList.get().strip():
             errors.append('You have not added any mutation to the list. Do so using the "Add defined '
                           'mutations" wizard once you have defined it.')
-
         else:
-            for i, line in enumerate(self.toMutateList.get().upper().strip().split('\n')):
-                pattern = re.compile(r'([A-Z]+)([A-Z]+)([^a-zA-Z]+)([A-Z]+)')
-                match = re.match(pattern, line)
-
-                if match:
-                    aaFrom, chain, position, aaTo = match.groups()
-                    if chain not in validChains:
-                        errors.append(f'The chain "{chain}" of the mutation "{line}" is not present in the PDB file. '
-                                        f'The PDB file contains the following chains: {", ".join(validChains)}.')
-                    
-                    elif not position.isdigit():
-                        errors.append(f'The position of the mutation "{line}" must be an integer.')
-                    
-                    elif aaFrom not in AA_THREE_TO_ONE.values():
-                        errors.append(f'The wild-type aminoacid of the mutation "{line}" does not ' 
-                                        'exist or is not written with its one-letter code.')
-                    
-                    elif aaTo not in AA_THREE_TO_ONE.values():
-                        errors.append(f'The mutant aminoacid of the mutation "{line}" does not ' 
-                                        'exist or is not written with its one-letter code.')
-
-                    else:   
-                        position = int(position)             
-                        residues_dict = {res[0]: res[1] for res in chainResidues[chain]}
-                        if position not in residues_dict.keys():
-                            first_residue = list(residues_dict.keys())[0]
-                            last_residue = list(residues_dict.keys())[-1]
-                            errors.append(f'Position "{position}" in chain "{chain}" for mutation "{line}" is out of range. '
-                                            f'The chain "{chain}" has positions from {first_residue} to {last_residue}.')
-                        
-                        elif AA_THREE_TO_ONE[residues_dict[position]] != aaFrom:
-                            errors.append(f'The wild-type aminoacid "{aaFrom}" at position "{position}" in chain "{chain}" '
-                                            f'for mutation "{line}" does not match the PDB file. The aminoacid at that position '
-                                            f'is {residues_dict[position]} ({AA_THREE_TO_ONE[residues_dict[position]]}).')
-                else:
-                    errors.append(f'The mutation "{line}" does not have the 4 necessary parameters. ' 
-                                   'Mutation format must be "[aaFrom][Chain][Position][aaTo]".')
+            mutErrors = validateMutationLists(self.inputAtomStruct.get().getFileName(), [self.toMutateList.get()])
+            errors += [error.message for error in mutErrors]
         return errors
 
     def _summary(self):
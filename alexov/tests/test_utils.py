@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+# **************************************************************************
+# *
+# * Authors:     Carlos Oscar Sorzano (coss@cnb.csic.es)
+# *              Natalia del Rey
+# *
+# * Natl. Center of Biotechnology CSIC
+# *
+# * This program is free software; you can redistribute it and/or modify
+# * it under the terms of the GNU General Public License as published by
+# * the Free Software Foundation; either version 2 of the License, or
+# * (at your option) any later version.
+# *
+# * This program is distributed in the hope that it will be useful,
+# * but WITHOUT ANY WARRANTY; without even the implied warranty of
+# * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# * GNU General Public License for more details.
+# *
+# * You should have received a copy of the GNU General Public License
+# * along with this program; if not, write to the Free Software
+# * Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA
+# * 02111-1307  USA
+# *
+# *  All comments concerning this program package may be sent to the
+# *  e-mail address 'scipion@cnb.csic.es'
+# *
+# **************************************************************************
+
+import os, shutil, tempfile, unittest
+from types import SimpleNamespace
+import numpy as np
+
+from alexov.utils import parseResidueTable, validateMutationLists
+
+
+def buildResidueTable():
+    """ Chain A: CYS 10, GLY 11. Chain B: TYR 5. """
+    return {'resNumbers': np.array([10, 11, 5], dtype=np.int32),
+            'resInsCodes': np.array(['', '', '']),
+            'resNames': np.array(['CYS', 'GLY', 'TYR']),
+            'resChains': np.array([0, 0, 1], dtype=np.int32),
+            'chainIds': np.array(['A', 'B'])}
+
+
+def pdbAtom(serial, resName, chain, resNumber, insCode='', record='ATOM'):
+    return '%-6s%5d  CA  %3s %1s%4d%1s   %8.3f%8.3f%8.3f  1.00  0.00           C' % \
+        (record, serial, resName, chain, resNumber, insCode, serial, 0.0, 0.0)
+
+
+def writePDB(fnPDB):
+    """
+    Model 1. Chain A: CYS 10, GLY 11, ALA 11A. Chain B: TYR 5. Chain W: only a water.
+    Model 2. Chain A: SER 10 (ignored, chain A comes from model 1). Chain C: LYS 1.
+    """
+    lines = ['MODEL        1', pdbAtom(1, 'CYS', 'A', 10), pdbAtom(2, 'GLY', 'A', 11),
+             pdbAtom(3, 'ALA', 'A', 11, 'A'), 'TER', pdbAtom(4, 'TYR', 'B', 5), 'TER',
+             pdbAtom(5, 'HOH', 'W', 1, record='HETATM'), 'ENDMDL',
+             'MODEL        2', pdbAtom(6, 'SER', 'A', 10), 'TER', pdbAtom(7, 'LYS', 'C', 1), 'TER', 'ENDMDL', 'END']
+    with open(fnPDB, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return fnPDB
+
+
+def writeCIF(fnCIF):
+    """ A single atom of residue ABCDE 1 in chain LONGCHAIN. """
+    lines = ['data_test', 'loop_', '_atom_site.group_PDB', '_atom_site.id', '_atom_site.type_symbol',
+             '_atom_site.label_atom_id', '_atom_site.label_alt_id', '_atom_site.label_comp_id',
+             '_atom_site.label_asym_id', '_atom_site.label_entity_id', '_atom_site.label_seq_id',
+             '_atom_site.pdbx_PDB_ins_code', '_atom_site.Cartn_x', '_atom_site.Cartn_y', '_atom_site.Cartn_z',
+             '_atom_site.occupancy', '_atom_site.B_iso_or_equiv', '_atom_site.auth_seq_id',
+             '_atom_site.auth_comp_id', '_atom_site.auth_asym_id', '_atom_site.auth_atom_id',
+             '_atom_site.pdbx_PDB_model_num',
+             'HETATM 1 C C1 . ABCDE LONGCHAIN 1 1 ? 0.0 0.0 0.0 1.00 0.00 1 ABCDE LONGCHAIN C1 1']
+    with open(fnCIF, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return fnCIF
+
+
+class TestParseResidueTable(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def testChainsFromEveryModel(self):
+        table = parseResidueTable(writePDB(os.path.join(self.tmpDir, 'test.pdb')))
+
+        self.assertEqual(list(table['chainIds']), ['A', 'B', 'W', 'C'])
+        self.assertEqual(list(table['resNames']), ['CYS', 'GLY', 'ALA', 'TYR', 'LYS'])
+        self.assertEqual(list(table['resNumbers']), [10, 11, 11, 5, 1])
+        self.assertEqual(list(table['resInsCodes']), ['', '', 'A', '', ''])
+        self.assertEqual(list(table['resChains']), [0, 0, 0, 1, 3])
+
+    def testLongCIFNamesAreNotTruncated(self):
+        table = parseResidueTable(writeCIF(os.path.join(self.tmpDir, 'test.cif')))
+
+        self.assertEqual(list(table['chainIds']), ['LONGCHAIN'])
+        self.assertEqual(list(table['resNames']), ['ABCDE'])
+
+
+class TestValidateMutationLists(unittest.TestCase):
+    def assertCodes(self, errors, expected):
+        self.assertEqual([(error.listIdx, error.lineIdx, error.code) for error in errors], expected)
+
+    def testValidMutations(self):
+        self.assertEqual(validateMutationLists(buildResidueTable(), ['CA10Y\ngA11w', ['YB5X']]), [])
+
+    def testEveryErrorCode(self):
+        mutations = ['CA10Y', 'CAXY', 'CZ10Y', 'CA1.0Y', 'BA10Y', 'CA10B', 'CA99Y', 'GA10Y']
+        errors = validateMutationLists(buildResidueTable(), [mutations, []])
+
+        self.assertCodes(errors, [(0, 1, 'format'), (0, 2, 'chain'), (0, 3, 'position'), (0, 4, 'aaFrom'),
+                                  (0, 5, 'aaTo'), (0, 6, 'range'), (0, 7, 'wildType'), (1, None, 'empty')])
+        self.assertEqual(errors[5].message, 'Position "99" in chain "A" for mutation "CA99Y" is out of range. '
+                                            'The chain "A" has positions from 10 to 11.')
+        self.assertEqual(errors[6].message, 'The wild-type aminoacid "G" at position "10" in chain "A" for '
+                                            'mutation "GA10Y" does not match the PDB file. The aminoacid at '
+                                            'that position is CYS (C).')
+
+    def testMultiListBatch(self):
+        errors = validateMutationLists(buildResidueTable(), ['CA10Y\nCA12Y', '', ['YB5A', 'YA5A'], ' \n '])
+
+        self.assertCodes(errors, [(0, 1, 'range'), (1, None, 'empty'), (2, 1, 'range'), (3, None, 'empty')])
+        self.assertEqual(errors[0].mutation, 'CA12Y')
+
+    def testPositionOverflowIsOutOfRange(self):
+        # Beyond 4300 digits int() raises on Python >= 3.11, leading zeros are still a valid position
+        errors = validateMutationLists(buildResidueTable(), [['GA99999999999999999999Y', 'CA10Y',
+                                                              'CA' + '1' * 5000 + 'Y', 'CA' + '0' * 5000 + '10Y']])
+        self.assertCodes(errors, [(0, 0, 'range'), (0, 2, 'range')])
+        self.assertEqual(errors[1].message, f'Position "{"1" * 5000}" in chain "A" for mutation '
+                                            f'"CA{"1" * 5000}Y" is out of range. '
+                                            'The chain "A" has positions from 10 to 11.')
+
+    def testPositionsDoNotCollideWithOtherChains(self):
+        # 2**32 + 1 would be packed as chain B residue 1 without the int32 bound check
+        table = buildResidueTable()
+        table['resNumbers'] = np.array([10, 11, 1], dtype=np.int32)
+        errors = validateMutationLists(table, [['GA4294967297Y', 'YA4294967297Y']])
+        self.assertCodes(errors, [(0, 0, 'range'), (0, 1, 'range')])
+
+    def testUnicodeDigitsAreNotPositions(self):
+        errors = validateMutationLists(buildResidueTable(), [['GA\u00b9Y', 'GA\u0661\u0660Y']])
+        self.assertCodes(errors, [(0, 0, 'position'), (0, 1, 'position')])
+
+
+class TestValidateStructureFile(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.fnPDB = writePDB(os.path.join(self.tmpDir, 'test.pdb'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def testInsertionCodesAndWaterChains(self):
+        errors = validateMutationLists(self.fnPDB, [['GA11Y', 'AA11Y', 'KC1A', 'SA10Y', 'AW1Y']])
+
+        # Residue 11A is not addressable, so position 11 is GLY; chain A comes from model 1
+        self.assertEqual([(error.lineIdx, error.code) for error in errors],
+                         [(1, 'wildType'), (3, 'wildType'), (4, 'range')])
+        self.assertEqual(errors[2].message, 'Position "1" in chain "W" for mutation "AW1Y" is out of range. '
+                                            'The chain "W" has no residues.')
+
+
+class TestProtocolValidate(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Imported here so that a missing protocol dependency only affects these tests
+        from alexov.protocols import ProtocolSAAMBE3D
+        cls.protocolClass = ProtocolSAAMBE3D
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.fnPDB = writePDB(os.path.join(self.tmpDir, 'test.pdb'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def validate(self, toMutateList):
+        protocol = SimpleNamespace(inputAtomStruct=SimpleNamespace(get=lambda: SimpleNamespace(
+                                       getFileName=lambda: self.fnPDB)),
+                                   toMutateList=SimpleNamespace(get=lambda: toMutateList))
+        return self.protocolClass._validate(protocol)
+
+    def testEmptyList(self):
+        self.assertEqual(self.validate('  '), ['You have not added any mutation to the list. Do so using the '
+                                               '"Add defined mutations" wizard once you have defined it.'])
+
+    def testMessages(self):
+        errors = self.validate('CA10Y\nCAXY\ncZ10y\nCA1.0Y\nBA10Y\nCA10B\nCA99Y\nGA10Y')
+        self.assertEqual(errors, [
+            'The mutation "CAXY" does not have the 4 necessary parameters. '
+            'Mutation format must be "[aaFrom][Chain][Position][aaTo]".',
+            'The chain "Z" of the mutation "CZ10Y" is not present in the PDB file. '
+            'The PDB file contains the following chains: A, B, W, C.',
+            'The position of the mutation "CA1.0Y" must be an integer.',
+            'The wild-type aminoacid of the mutation "BA10Y" does not '
+            'exist or is not written with its one-letter code.',
+            'The mutant aminoacid of the mutation "CA10B" does not '
+            'exist or is not written with its one-letter code.',
+            'Position "99" in chain "A" for mutation "CA99Y" is out of range. '
+            'The chain "A" has positions from 10 to 11.',
+            'The wild-type aminoacid "G" at position "10" in chain "A" for mutation "GA10Y" does not match '
+            'the PDB file. The aminoacid at that position is CYS (C).'])
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+# **************************************************************************
+# *
+# * Authors:     Carlos Oscar Sorzano (coss@cnb.csic.es)
+# *              Natalia del Rey
+# *
+# * Natl. Center of Biotechnology CSIC
+# *
+# * This program is free software; you can redistribute it and/or modify
+# * it under the terms of the GNU General Public License as published by
+# * the Free Software Foundation; either version 2 of the License, or
+# * (at your option) any later version.
+# *
+# * This program is distributed in the hope that it will be useful,
+# * but WITHOUT ANY WARRANTY; without even the implied warranty of
+# * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# * GNU General Public License for more details.
+# *
+# * You should have received a copy of the GNU General Public License
+# * along with this program; if not, write to the Free Software
+# * Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA
+# * 02111-1307  USA
+# *
+# *  All comments concerning this program package may be sent to the
+# *  e-mail address 'scipion@cnb.csic.es'
+# *
+# **************************************************************************
+
+"""
+Utilities to parse the residue table of an atomic structure once into flat NumPy arrays and validate
+mutation lists against it in bulk.
+"""
+from collections import namedtuple
+import numpy as np
+import re
+
+import pwem.convert as emconv
+
+from alexov.constants import AA_THREE_TO_ONE
+
+# Names of the residue table arrays, grouped by the entity they index
+RESIDUE_ARRAYS = ['resNumbers', 'resInsCodes', 'resNames', 'resChains']
+CHAIN_ARRAYS = ['chainIds']
+RESIDUE_TABLE = RESIDUE_ARRAYS + CHAIN_ARRAYS
+
+MUTATION_PATTERN = re.compile(r'([A-Z]+)([A-Z]+)([^a-zA-Z]+)([A-Z]+)')
+POSITION_PATTERN = re.compile(r'[0-9]+')
+MAX_POSITION = np.iinfo(np.int32).max
+
+# Error record returned by validateMutationLists. listIdx and lineIdx locate the mutation in the input,
+# code is one of 'empty', 'format', 'chain', 'position', 'aaFrom', 'aaTo', 'range' or 'wildType'
+MutationError = namedtuple('MutationError', ['listIdx', 'lineIdx', 'mutation', 'code', 'message'])
+
+
+def parseResidueTable(fnStructure):
+    """
+    Parses the residues of an atomic structure (PDB or mmCIF) into flat NumPy arrays. As in getModelsChains,
+    chains are collected from every model, each one taken from the first model that contains it. Waters are
+    skipped, so chains with only waters are kept in chainIds without residues.
+    Per residue: resNumbers, resInsCodes ('' if none), resNames and resChains (chain index). Per chain: chainIds.
+    """
+    structureHandler = emconv.AtomicStructHandler()
+    structureHandler.read(fnStructure)
+
+    resNumbers, resInsCodes, resNames, resChains, chainIds = [], [], [], [], []
+    for model in structureHandler.getStructure():
+        for chain in model:
+            if chain.get_id() in chainIds:
+                continue
+            chainIdx = len(chainIds)
+            chainIds.append(chain.get_id())
+            for residue in chain:
+                if residue.get_resname() == 'HOH':
+                    continue
+                resNumbers.append(residue.get_id()[1])
+                resInsCodes.append(residue.get_id()[2].strip())
+                resNames.append(residue.get_resname())
+                resChains.append(chainIdx)
+
+    # String dtypes are sized from the data, so long mmCIF chain IDs or residue codes are not truncated
+    return {'resNumbers': np.array(resNumbers, dtype=np.int32),
+            'resInsCodes': np.array(resInsCodes, dtype=str),
+            'resNames': np.array(resNames, dtype=str),
+            'resChains': np.array(resChains, dtype=np.int32),
+            'chainIds': np.array(chainIds, dtype=str)}
+
+
+def checkResidueTable(table):
+    """
+    Checks that all the residue table arrays are present and that the arrays indexing the same entity
+    (residues or chains) have the same length. Raises ValueError otherwise.
+    """
+    missing = [name for name in RESIDUE_TABLE if name not in table]
+    if missing:
+        raise ValueError(f'Missing residue table arrays: {", ".join(missing)}.')
+
+    for group in [RESIDUE_ARRAYS, CHAIN_ARRAYS]:
+        lengths = {name: len(table[name]) for name in group}
+        if len(set(lengths.values())) > 1:
+            raise ValueError('Inconsistent residue table lengths: ' +
+                             ', '.join(f'{name}={length}' for name, length in lengths.items()) + '.')
+    return table
+
+
+def getResidueTable(structure):
+    """
+    Returns the residue table from a residue table dictionary or an atomic structure file.
+    """
+    if isinstance(structure, dict):
+        return checkResidueTable(structure)
+    return parseResidueTable(structure)
+
+
+def validateMutationLists(structure, mutationLists):
+    """
+    Validates many mutation lists against a single residue table, so that bad inputs can be rejected
+    in bulk without a protocol instance. Each list may be a newline separated string (as in the
+    SAAMBE3D "List of mutations") or a list of mutation strings with format "[aaFrom][Chain][Position][aaTo]".
+    structure may be an atomic structure file or a residue table dictionary from parseResidueTable.
+    Positions refer to residues without insertion code; residues with an insertion code cannot be mutated.
+    Returns a list of MutationError, empty if every mutation is valid.
+    """
+    table = getResidueTable(structure)
+    errors, mutations, locations, groups, positions = [], [], [], [], []
+    for listIdx, mutList in enumerate(mutationLists):
+        lines = mutList.upper().strip().split('\n') if isinstance(mutList, str) \
+            else [mut.upper().strip() for mut in mutList]
+        if not any(lines):
+            errors.append(MutationError(listIdx, None, None, 'empty', 'The mutation list is empty.'))
+            continue
+
+        for lineIdx, line in enumerate(lines):
+            match = re.match(MUTATION_PATTERN, line)
+            if match:
+                mutations.append(line)
+                locations.append((listIdx, lineIdx))
+                groups.append(match.groups())
+                position = match.group(3)
+                # Kept as a digits string: int() of a huge position would raise before any range check
+                positions.append((position.lstrip('0') or '0') if POSITION_PATTERN.fullmatch(position) else None)
+            else:
+                errors.append(MutationError(listIdx, lineIdx, line, 'format',
+                                            f'The mutation "{line}" does not have the 4 necessary parameters. '
+                                            'Mutation format must be "[aaFrom][Chain][Position][aaTo]".'))
+    if not groups:
+        return sorted(errors, key=_errorOrder)
+
+    # Residue table: one key per (chain, position) pair of the residues without insertion code
+    chainIds, resChains = np.asarray(table['chainIds']), np.asarray(table['resChains'])
+    resNumbers, resNames = np.asarray(table['resNumbers']), np.asarray(table['resNames'])
+    addressable = np.flatnonzero(np.asarray(table['resInsCodes']) == '')
+    resKeys = _residueKeys(resChains[addressable], resNumbers[addressable])
+    resOrder = addressable[np.argsort(resKeys, kind='stable')]
+    resKeys = np.sort(resKeys, kind='stable')
+    chainBounds = {chainIds[chainIdx]: (resNumbers[idxs[0]], resNumbers[idxs[-1]])
+                   for chainIdx in np.unique(resChains) for idxs in [np.flatnonzero(resChains == chainIdx)]}
+
+    # Vectorized checks over every mutation of every list
+    aaFrom, chains, _, aaTo = (np.array(col, dtype=str) for col in zip(*groups))
+    validAAs = np.array(list(AA_THREE_TO_ONE.values()))
+    badChain = ~np.isin(chains, chainIds)
+    badPosition = np.array([position is None for position in positions])
+    badFrom = ~np.isin(aaFrom, validAAs)
+    badTo = ~np.isin(aaTo, validAAs)
+    # Positions above the int32 residue numbers cannot exist and must not be packed into the keys
+    outOfRange = np.array([position is not None and (len(position) > len(str(MAX_POSITION)) or
+                                                     int(position) > MAX_POSITION) for position in positions])
+
+    chainLookup = {chainId: chainIdx for chainIdx, chainId in enumerate(chainIds)}
+    mutChains = np.array([chainLookup.get(chain, 0) for chain in chains])
+    mutPositions = np.array([0 if position is None or tooLarge else int(position)
+                             for position, tooLarge in zip(positions, outOfRange)], dtype=np.int64)
+    mutKeys = _residueKeys(mutChains, mutPositions)
+    if len(resKeys):
+        found = np.minimum(np.searchsorted(resKeys, mutKeys), len(resKeys) - 1)
+        inRange = (resKeys[found] == mutKeys) & ~outOfRange
+        mutResNames = resNames[resOrder[found]]
+    else:
+        inRange, mutResNames = np.zeros(len(mutKeys), dtype=bool), np.full(len(mutKeys), '')
+    badWildType = np.array([AA_THREE_TO_ONE.get(resName) for resName in mutResNames]) != aaFrom
+
+    codes = np.select([badChain, badPosition, badFrom, badTo, ~inRange, badWildType],
+                      ['chain', 'position', 'aaFrom', 'aaTo', 'range', 'wildType'], default='')
+    for idx in np.flatnonzero(codes != ''):
+        code, line, chain, position = codes[idx], mutations[idx], chains[idx], positions[idx]
+        if code == 'chain':
+            message = f'The chain "{chain}" of the mutation "{line}" is not present in the PDB file. ' \
+                      f'The PDB file contains the following chains: {", ".join(chainIds)}.'
+        elif code == 'position':
+            message = f'The position of the mutation "{line}" must be an integer.'
+        elif code == 'aaFrom':
+            message = f'The wild-type aminoacid of the mutation "{line}" does not ' \
+                      'exist or is not written with its one-letter code.'
+        elif code == 'aaTo':
+            message = f'The mutant aminoacid of the mutation "{line}" does not ' \
+                      'exist or is not written with its one-letter code.'
+        elif code == 'range' and chain in chainBounds:
+            firstResidue, lastResidue = chainBounds[chain]
+            message = f'Position "{position}" in chain "{chain}" for mutation "{line}" is out of range. ' \
+                      f'The chain "{chain}" has positions from {firstResidue} to {lastResidue}.'
+        elif code == 'range':
+            message = f'Position "{position}" in chain "{chain}" for mutation "{line}" is out of range. ' \
+                      f'The chain "{chain}" has no residues.'
+        else:
+            resName = mutResNames[idx]
+            message = f'The wild-type aminoacid "{aaFrom[idx]}" at position "{position}" in chain "{chain}" ' \
+                      f'for mutation "{line}" does not match the PDB file. The aminoacid at that position ' \
+                      f'is {resName} ({AA_THREE_TO_ONE.get(resName, "?")}).'
+        errors.append(MutationError(*locations[idx], line, str(code), message))
+
+    return sorted(errors, key=_errorOrder)
+
+
+def _residueKeys(chainIdxs, positions):
+    """
+    Packs chain indexes and residue positions into a single sortable int64 key.
+    Positions must fit in int32, otherwise keys of different chains collide.
+    """
+    return (np.asarray(chainIdxs, dtype=np.int64) << 32) + (np.asarray(positions, dtype=np.int64) + 2 ** 31)
+
+
+def _errorOrder(error):
+    return error.listIdx, -1 if error.lineIdx is None else error.lineIdx